@@ -1,26 +1,58 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, session
-from functools import wraps
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from datetime import datetime
-from urllib.parse import quote
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g
+import math
+import os
 import database
+import backup
+import replenishment
+import scanner
+from decorators import login_required, snapshot_read, record_write
+from exports import exports
+from assets import assets, asset_url, build_assets, compress_response
 from secret import USERNAME,PASSWORD
 
 app = Flask(__name__)
 app.secret_key = 'stock_manager_secret_key'
 
+app.register_blueprint(exports)
+app.register_blueprint(assets)
+app.after_request(record_write)
+app.after_request(compress_response)
+app.add_template_global(asset_url)
+build_assets()
+
 CATEGORIES = ['耐克衣服', '耐克鞋子', '耐克配件', '阿迪衣服', '阿迪鞋子', '阿迪配件', '李宁衣服', '李宁鞋子', '李宁配件']
 
 
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session:
-            return redirect(url_for('login'))
-        return f(*args, **kwargs)
-    return decorated_function
+@app.before_request
+def select_store():
+    """根据URL参数或session选择当前店铺的数据库"""
+    # 静态资源不访问数据库，也不能读session，否则响应会带上 Vary: Cookie 而无法被共享缓存
+    if request.blueprint == 'assets' or request.endpoint == 'static':
+        return
+    store_id = request.args.get('store')
+    if store_id in database.STORES:
+        session['store'] = store_id
+    store_id = session.get('store')
+    if store_id not in database.STORES:
+        store_id = database.DEFAULT_STORE
+    g.store_token = database.set_store(store_id)
+
+
+@app.teardown_request
+def release_store(exc=None):
+    """请求结束后恢复默认店铺"""
+    token = g.pop('store_token', None)
+    if token is not None:
+        database.reset_store(token)
+
+
+@app.context_processor
+def inject_stores():
+    """向模板注入店铺信息"""
+    return {
+        'stores': database.STORES,
+        'current_store': database.get_store(),
+    }
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -62,6 +94,38 @@ def index():
                            selected_category=category)
 
 
+@app.route('/switch_store/<store_id>')
+@login_required
+def switch_store(store_id):
+    """切换当前店铺"""
+    if store_id not in database.STORES:
+        flash('店铺不存在！', 'error')
+    else:
+        session['store'] = store_id
+        flash(f'已切换到{database.STORES[store_id][0]}', 'success')
+    return redirect(url_for('index'))
+
+
+@app.route('/consolidated')
+@login_required
+@snapshot_read
+def consolidated():
+    """所有店铺汇总"""
+    category = request.args.get('category', 'all')
+    inventory = database.get_consolidated_inventory(category)
+    total_value, store_values = database.get_consolidated_total_value()
+    monthly_summary = database.get_consolidated_monthly_summary()
+    yearly_summary = database.get_consolidated_yearly_summary()
+    return render_template('consolidated.html',
+                           inventory=inventory,
+                           total_value=total_value,
+                           store_values=store_values,
+                           monthly_summary=monthly_summary,
+                           yearly_summary=yearly_summary,
+                           categories=CATEGORIES,
+                           selected_category=category)
+
+
 @app.route('/stock_in', methods=['GET', 'POST'])
 @login_required
 def stock_in():
@@ -149,6 +213,7 @@ def delete_stock_out():
 
 @app.route('/records')
 @login_required
+@snapshot_read
 def records():
     """出入库记录"""
     stock_in_records = database.get_stock_in_records()
@@ -160,6 +225,7 @@ def records():
 
 @app.route('/monthly')
 @login_required
+@snapshot_read
 def monthly():
     """月度汇总"""
     summary = database.get_monthly_summary()
@@ -183,331 +249,63 @@ def get_item(item_id):
     return jsonify({'error': '未找到'}), 404
 
 
-@app.route('/yearly')
+@app.route('/api/scan/<path:barcode>')
 @login_required
-def yearly():
-    """年度汇总"""
-    summary = database.get_yearly_summary()
-    return render_template('yearly.html', summary=summary)
-
+def scan(barcode):
+    """扫码查询库存API"""
+    return jsonify({'items': scanner.lookup(barcode)})
 
-def create_excel_style():
-    """创建Excel样式"""
-    header_font = Font(bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-    header_alignment = Alignment(horizontal='center', vertical='center')
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    return header_font, header_fill, header_alignment, thin_border
 
-
-@app.route('/export/inventory')
+@app.route('/api/scan/sell', methods=['POST'])
 @login_required
-def export_inventory():
-    """导出当前库存为Excel"""
-    category = request.args.get('category', 'all')
-    inventory = database.get_inventory(category)
-    total_value = database.get_total_value()
+def scan_sell():
+    """扫码出库API"""
+    try:
+        sell_price = float(request.form['sell_price'])
+        quantity = int(request.form.get('quantity', 1))
+        item_id = int(request.form['item_id']) if request.form.get('item_id') else None
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': '卖出价、数量或库存项无效'}), 400
+    if not math.isfinite(sell_price) or sell_price < 0 or quantity < 1:
+        return jsonify({'success': False, 'message': '卖出价、数量或库存项无效'}), 400
+
+    if item_id is None:
+        items = scanner.lookup(request.form.get('barcode', ''))
+        if not items:
+            return jsonify({'success': False, 'message': '未找到该条码对应的库存'}), 404
+        # 同一货号尺码有多个进货价时优先出最早入库的
+        item_id = items[0]['id']
+
+    success, message = database.remove_stock(item_id, sell_price, quantity)
+    return jsonify({'success': success, 'message': message, 'item_id': item_id}), 200 if success else 400
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "当前库存"
-
-    header_font, header_fill, header_alignment, thin_border = create_excel_style()
-
-    # 标题行
-    headers = ['类别', '货号', '尺码', '进货价', '数量', '货值']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    # 数据行
-    for row_idx, item in enumerate(inventory, 2):
-        ws.cell(row=row_idx, column=1, value=item['category']).border = thin_border
-        ws.cell(row=row_idx, column=2, value=item['product_code']).border = thin_border
-        ws.cell(row=row_idx, column=3, value=item['size']).border = thin_border
-        ws.cell(row=row_idx, column=4, value=item['purchase_price']).border = thin_border
-        ws.cell(row=row_idx, column=5, value=item['quantity']).border = thin_border
-        ws.cell(row=row_idx, column=6, value=item['purchase_price'] * item['quantity']).border = thin_border
-
-    # 合计行
-    last_row = len(inventory) + 2
-    ws.cell(row=last_row, column=5, value='总货值:').font = Font(bold=True)
-    ws.cell(row=last_row, column=6, value=total_value).font = Font(bold=True)
-
-    # 调整列宽
-    ws.column_dimensions['A'].width = 10
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 10
-    ws.column_dimensions['D'].width = 12
-    ws.column_dimensions['E'].width = 10
-    ws.column_dimensions['F'].width = 12
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"库存_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        output.getvalue(),
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
-    )
-
-
-@app.route('/export/stock_in')
-@login_required
-def export_stock_in():
-    """导出入库记录为Excel"""
-    records = database.get_stock_in_records()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "入库记录"
-
-    header_font, header_fill, header_alignment, thin_border = create_excel_style()
-
-    headers = ['时间', '类别', '货号', '尺码', '进货价', '数量', '金额']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    for row_idx, record in enumerate(records, 2):
-        ws.cell(row=row_idx, column=1, value=record['created_at']).border = thin_border
-        ws.cell(row=row_idx, column=2, value=record['category']).border = thin_border
-        ws.cell(row=row_idx, column=3, value=record['product_code']).border = thin_border
-        ws.cell(row=row_idx, column=4, value=record['size']).border = thin_border
-        ws.cell(row=row_idx, column=5, value=record['purchase_price']).border = thin_border
-        ws.cell(row=row_idx, column=6, value=record['quantity']).border = thin_border
-        ws.cell(row=row_idx, column=7, value=record['purchase_price'] * record['quantity']).border = thin_border
-
-    ws.column_dimensions['A'].width = 20
-    ws.column_dimensions['B'].width = 10
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 10
-    ws.column_dimensions['E'].width = 12
-    ws.column_dimensions['F'].width = 10
-    ws.column_dimensions['G'].width = 12
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"入库记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        output.getvalue(),
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
-    )
-
-
-@app.route('/export/stock_out')
-@login_required
-def export_stock_out():
-    """导出出库记录为Excel"""
-    records = database.get_stock_out_records()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "出库记录"
-
-    header_font, header_fill, header_alignment, thin_border = create_excel_style()
-
-    headers = ['时间', '类别', '货号', '尺码', '进货价', '卖出价', '数量', '利润']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    for row_idx, record in enumerate(records, 2):
-        ws.cell(row=row_idx, column=1, value=record['created_at']).border = thin_border
-        ws.cell(row=row_idx, column=2, value=record['category']).border = thin_border
-        ws.cell(row=row_idx, column=3, value=record['product_code']).border = thin_border
-        ws.cell(row=row_idx, column=4, value=record['size']).border = thin_border
-        ws.cell(row=row_idx, column=5, value=record['purchase_price']).border = thin_border
-        ws.cell(row=row_idx, column=6, value=record['sell_price']).border = thin_border
-        ws.cell(row=row_idx, column=7, value=record['quantity']).border = thin_border
-        profit_cell = ws.cell(row=row_idx, column=8, value=record['profit'])
-        profit_cell.border = thin_border
-        if record['profit'] < 0:
-            profit_cell.font = Font(color='FF0000')
-
-    ws.column_dimensions['A'].width = 20
-    ws.column_dimensions['B'].width = 10
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 10
-    ws.column_dimensions['E'].width = 12
-    ws.column_dimensions['F'].width = 12
-    ws.column_dimensions['G'].width = 10
-    ws.column_dimensions['H'].width = 12
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"出库记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        output.getvalue(),
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
-    )
-
-
-@app.route('/export/monthly')
-@login_required
-def export_monthly():
-    """导出月度汇总为Excel"""
-    summary = database.get_monthly_summary()
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "月度汇总"
-
-    header_font, header_fill, header_alignment, thin_border = create_excel_style()
-
-    headers = ['月份', '销售额', '成本', '利润', '销量', '利润率']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    total_revenue = 0
-    total_cost = 0
-    total_profit = 0
-    total_quantity = 0
-
-    for row_idx, record in enumerate(summary, 2):
-        ws.cell(row=row_idx, column=1, value=record['month']).border = thin_border
-        ws.cell(row=row_idx, column=2, value=record['revenue']).border = thin_border
-        ws.cell(row=row_idx, column=3, value=record['cost']).border = thin_border
-        profit_cell = ws.cell(row=row_idx, column=4, value=record['total_profit'])
-        profit_cell.border = thin_border
-        if record['total_profit'] < 0:
-            profit_cell.font = Font(color='FF0000')
-        ws.cell(row=row_idx, column=5, value=record['total_quantity']).border = thin_border
-        profit_rate = (record['total_profit'] / record['cost'] * 100) if record['cost'] else 0
-        ws.cell(row=row_idx, column=6, value=f"{profit_rate:.1f}%").border = thin_border
-
-        total_revenue += record['revenue'] or 0
-        total_cost += record['cost'] or 0
-        total_profit += record['total_profit'] or 0
-        total_quantity += record['total_quantity'] or 0
-
-    # 合计行
-    last_row = len(summary) + 2
-    ws.cell(row=last_row, column=1, value='合计').font = Font(bold=True)
-    ws.cell(row=last_row, column=2, value=total_revenue).font = Font(bold=True)
-    ws.cell(row=last_row, column=3, value=total_cost).font = Font(bold=True)
-    ws.cell(row=last_row, column=4, value=total_profit).font = Font(bold=True)
-    ws.cell(row=last_row, column=5, value=total_quantity).font = Font(bold=True)
-
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 15
-    ws.column_dimensions['E'].width = 10
-    ws.column_dimensions['F'].width = 12
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"月度汇总_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        output.getvalue(),
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
-    )
-
-
-@app.route('/export/yearly')
+@app.route('/yearly')
 @login_required
-def export_yearly():
-    """导出年度汇总为Excel"""
+@snapshot_read
+def yearly():
+    """年度汇总"""
     summary = database.get_yearly_summary()
+    return render_template('yearly.html', summary=summary)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "年度汇总"
-
-    header_font, header_fill, header_alignment, thin_border = create_excel_style()
-
-    headers = ['年份', '销售额', '成本', '利润', '销量', '利润率']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-
-    total_revenue = 0
-    total_cost = 0
-    total_profit = 0
-    total_quantity = 0
-
-    for row_idx, record in enumerate(summary, 2):
-        ws.cell(row=row_idx, column=1, value=record['year']).border = thin_border
-        ws.cell(row=row_idx, column=2, value=record['revenue']).border = thin_border
-        ws.cell(row=row_idx, column=3, value=record['cost']).border = thin_border
-        profit_cell = ws.cell(row=row_idx, column=4, value=record['total_profit'])
-        profit_cell.border = thin_border
-        if record['total_profit'] < 0:
-            profit_cell.font = Font(color='FF0000')
-        ws.cell(row=row_idx, column=5, value=record['total_quantity']).border = thin_border
-        profit_rate = (record['total_profit'] / record['cost'] * 100) if record['cost'] else 0
-        ws.cell(row=row_idx, column=6, value=f"{profit_rate:.1f}%").border = thin_border
-
-        total_revenue += record['revenue'] or 0
-        total_cost += record['cost'] or 0
-        total_profit += record['total_profit'] or 0
-        total_quantity += record['total_quantity'] or 0
-
-    # 合计行
-    last_row = len(summary) + 2
-    ws.cell(row=last_row, column=1, value='合计').font = Font(bold=True)
-    ws.cell(row=last_row, column=2, value=total_revenue).font = Font(bold=True)
-    ws.cell(row=last_row, column=3, value=total_cost).font = Font(bold=True)
-    ws.cell(row=last_row, column=4, value=total_profit).font = Font(bold=True)
-    ws.cell(row=last_row, column=5, value=total_quantity).font = Font(bold=True)
-
-    ws.column_dimensions['A'].width = 10
-    ws.column_dimensions['B'].width = 15
-    ws.column_dimensions['C'].width = 15
-    ws.column_dimensions['D'].width = 15
-    ws.column_dimensions['E'].width = 10
-    ws.column_dimensions['F'].width = 12
-
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    filename = f"年度汇总_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    encoded_filename = quote(filename)
-    return Response(
-        output.getvalue(),
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
-    )
+
+@app.route('/replenishment')
+@login_required
+@snapshot_read
+def replenishment_page():
+    """补货建议（由后台任务定期计算）"""
+    suggestions = replenishment.get_suggestions()
+    return render_template('replenishment.html',
+                           suggestions=suggestions,
+                           updated_at=replenishment.get_updated_at(),
+                           lead_time_days=replenishment.LEAD_TIME_DAYS,
+                           cover_days=replenishment.COVER_DAYS)
 
 
 if __name__ == '__main__':
     database.init_db()
+    scanner.warm()
+    # debug模式下重载器的父进程不处理请求，只在实际服务的进程中启动备份
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        backup.start_scheduler()
     app.run("0.0.0.0",debug=True, port=15000)
@@ -0,0 +1,119 @@
+from flask import Blueprint, request, send_from_directory, abort, url_for
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+VENDOR_DIR = os.path.join(STATIC_DIR, 'vendor')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+
+# 本地托管的静态资源（Bootstrap 5.3.0 及其依赖的 Popper 2.11.8）
+ASSETS = ['bootstrap.min.css', 'popper.min.js', 'bootstrap.min.js']
+
+# 文件名带内容哈希，内容变化即换URL，因此可以永久缓存
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 动态响应压缩
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
+COMPRESS_MIN_SIZE = 500
+COMPRESS_LEVEL = 6
+
+assets = Blueprint('assets', __name__)
+
+# 原始文件名 -> 带哈希的文件名
+_manifest = {}
+_hashed_names = set()
+
+
+def _write_once(filename, data):
+    """写入构建产物，已存在时跳过（文件名含哈希，内容必然相同）
+
+    多个进程可能同时启动，每个写入者使用各自的临时文件，写完后再原子替换到最终文件名。
+    """
+    path = os.path.join(DIST_DIR, filename)
+    if os.path.exists(path):
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=DIST_DIR, prefix='.' + filename, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def build_assets():
+    """生成带内容哈希的静态文件及其gzip/brotli预压缩版本"""
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    for name in ASSETS:
+        with open(os.path.join(VENDOR_DIR, name), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        hashed = f'{stem}.{digest}{ext}'
+
+        _write_once(hashed, data)
+        _write_once(hashed + '.gz', gzip.compress(data, 9, mtime=0))
+        if brotli is not None:
+            _write_once(hashed + '.br', brotli.compress(data))
+        manifest[name] = hashed
+
+    _manifest.clear()
+    _manifest.update(manifest)
+    _hashed_names.clear()
+    _hashed_names.update(manifest.values())
+    return manifest
+
+
+def asset_url(name):
+    """模板中获取静态资源的带哈希URL"""
+    return url_for('assets.static_asset', filename=_manifest[name])
+
+
+@assets.route('/assets/<filename>')
+def static_asset(filename):
+    """提供带哈希的静态资源，优先返回预压缩版本"""
+    if filename not in _hashed_names:
+        abort(404)
+
+    variant, encoding = filename, None
+    if brotli is not None and 'br' in request.accept_encodings:
+        variant, encoding = filename + '.br', 'br'
+    elif 'gzip' in request.accept_encodings:
+        variant, encoding = filename + '.gz', 'gzip'
+
+    response = send_from_directory(DIST_DIR, variant, mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """对HTML/JSON响应进行gzip压缩"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or 'gzip' not in request.accept_encodings):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, COMPRESS_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,177 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import database
+import ledger
+import replenishment
+
+BACKUP_DIR = 'backups'
+SNAPSHOT_DIR = 'snapshots'
+
+# 每隔多少秒备份一次，保留最近多少份
+BACKUP_INTERVAL = 24 * 60 * 60
+BACKUP_KEEP = 7
+
+# 备份失败后多久重试（秒）
+BACKUP_RETRY = 5 * 60
+
+# 报表只读快照的刷新间隔（秒），0 表示不使用快照
+SNAPSHOT_INTERVAL = 0
+
+# 在线备份每步复制的页数及每步之间的休眠，避免长时间占用数据库
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.01
+
+logger = logging.getLogger(__name__)
+
+_stop_event = threading.Event()
+_scheduler = None
+
+
+def _copy_database(src_path, dst_path):
+    """使用SQLite在线备份API复制数据库，先写临时文件再原子替换"""
+    tmp_path = dst_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst, pages=PAGES_PER_STEP, sleep=STEP_SLEEP)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp_path, dst_path)
+
+
+def backup_store(store_id):
+    """备份单个店铺的数据库，返回备份文件路径"""
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(BACKUP_DIR, f'{store_id}_{timestamp}.db')
+    _copy_database(database.STORES[store_id][1], path)
+    prune_backups(store_id)
+    return path
+
+
+def _list_backups(store_id):
+    """列出指定店铺的备份文件名，按时间从旧到新排序"""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    pattern = re.compile(rf'{re.escape(store_id)}_\d{{8}}_\d{{6}}\.db')
+    return sorted(name for name in os.listdir(BACKUP_DIR) if pattern.fullmatch(name))
+
+
+def prune_backups(store_id, keep=None):
+    """删除超出保留份数的旧备份"""
+    keep = BACKUP_KEEP if keep is None else keep
+    names = _list_backups(store_id)
+    for name in names[:max(len(names) - keep, 0)]:
+        os.remove(os.path.join(BACKUP_DIR, name))
+
+
+def _seconds_until_backup():
+    """距离下次备份的秒数，按各店铺最新备份文件的时间计算，没有备份的店铺立即备份"""
+    now = datetime.now()
+    remaining = BACKUP_INTERVAL
+    for store_id in database.STORES:
+        names = _list_backups(store_id)
+        if not names:
+            return 0
+        last = datetime.strptime(names[-1][len(store_id) + 1:-3], '%Y%m%d_%H%M%S')
+        remaining = min(remaining, BACKUP_INTERVAL - (now - last).total_seconds())
+    return remaining
+
+
+def backup_all():
+    """备份所有店铺的数据库"""
+    return [backup_store(store_id) for store_id in database.STORES]
+
+
+def refresh_snapshot(store_id):
+    """刷新单个店铺的只读快照"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = os.path.join(SNAPSHOT_DIR, f'{store_id}.db')
+    # 记录开始复制的时间，此前提交的写入都已包含在快照中
+    started = time.time()
+    _copy_database(database.STORES[store_id][1], path)
+    database.SNAPSHOTS[store_id] = (path, started)
+    return path
+
+
+def refresh_all_snapshots():
+    """刷新所有店铺的只读快照"""
+    return [refresh_snapshot(store_id) for store_id in database.STORES]
+
+
+def _run_scheduler():
+    """后台定时执行备份、账本检查点、补货建议和快照刷新"""
+    next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+    # 启动后立即计算一次补货建议，之后按间隔增量更新
+    next_replenishment = time.monotonic()
+    while not _stop_event.is_set():
+        if SNAPSHOT_INTERVAL and time.monotonic() >= next_snapshot:
+            try:
+                refresh_all_snapshots()
+            except Exception:
+                logger.exception('刷新只读快照失败')
+            next_snapshot = time.monotonic() + SNAPSHOT_INTERVAL
+
+        # 以上次备份文件的时间为准，重启或关机后不会推迟备份
+        backup_wait = _seconds_until_backup()
+        if backup_wait <= 0:
+            try:
+                backup_all()
+                backup_wait = BACKUP_INTERVAL
+            except Exception:
+                logger.exception('数据库备份失败')
+                backup_wait = BACKUP_RETRY
+
+        # 账本检查点按最近检查点的时间独立调度，使校验只需重放之后的变动
+        try:
+            checkpoint_wait = ledger.run_due_checkpoints()
+        except Exception:
+            logger.exception('生成账本检查点失败')
+            checkpoint_wait = BACKUP_RETRY
+
+        if time.monotonic() >= next_replenishment:
+            try:
+                replenishment.update_all()
+            except Exception:
+                logger.exception('更新补货建议失败')
+            next_replenishment = time.monotonic() + replenishment.UPDATE_INTERVAL
+
+        waits = [backup_wait, checkpoint_wait, next_replenishment - time.monotonic()]
+        if SNAPSHOT_INTERVAL:
+            waits.append(next_snapshot - time.monotonic())
+        _stop_event.wait(max(min(waits), 1))
+
+
+def start_scheduler():
+    """启动后台备份线程"""
+    global _scheduler
+    if _scheduler is not None and _scheduler.is_alive():
+        return _scheduler
+    if SNAPSHOT_INTERVAL:
+        # 启动时先生成一次快照，保证报表请求不会落到主库
+        refresh_all_snapshots()
+    _stop_event.clear()
+    _scheduler = threading.Thread(target=_run_scheduler, name='backup-scheduler', daemon=True)
+    _scheduler.start()
+    return _scheduler
+
+
+def stop_scheduler():
+    """停止后台备份线程"""
+    _stop_event.set()
+    if _scheduler is not None:
+        _scheduler.join()
+
+
+if __name__ == '__main__':
+    for backup_path in backup_all():
+        print(backup_path)
@@ -0,0 +1,169 @@
+"""性能基准：导入耗时、首个请求延迟、每个进程的常驻内存、页面体积和首字节时间
+
+用法: python benchmark.py [--runs N]
+结果以JSON输出到标准输出，便于CI记录和比较。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 在独立进程中冷启动应用并完成登录后的第一个请求
+FIRST_REQUEST_SCRIPT = '''
+import json, sys, time
+t0 = time.perf_counter()
+import app
+import database
+t1 = time.perf_counter()
+database.init_db()
+client = app.app.test_client()
+client.post('/login', data={'username': 'bench', 'password': 'bench'})
+t2 = time.perf_counter()
+response = client.get('/')
+t3 = time.perf_counter()
+assert response.status_code == 200, response.status_code
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'first_request_ms': (t3 - t2) * 1000,
+    'rss_kb': rss_kb,
+    'openpyxl_loaded': 'openpyxl' in sys.modules,
+}))
+'''
+
+# 启动真实的HTTP服务，测量首页首字节时间以及HTML和静态资源的传输体积
+PAGE_WEIGHT_SCRIPT = '''
+import http.client, json, re, threading, time, urllib.parse
+from werkzeug.serving import make_server
+import app
+import database
+database.init_db()
+server = make_server('127.0.0.1', 0, app.app, threaded=True)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+port = server.server_port
+ACCEPT = 'gzip, deflate, br'
+
+def request(method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    start = time.perf_counter()
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    ttfb = time.perf_counter() - start
+    data = response.read()
+    conn.close()
+    return response, data, ttfb
+
+response, _, _ = request('POST', '/login',
+                         body=urllib.parse.urlencode({'username': 'bench', 'password': 'bench'}),
+                         headers={'Content-Type': 'application/x-www-form-urlencoded'})
+cookie = response.getheader('Set-Cookie').split(';')[0]
+headers = {'Cookie': cookie, 'Accept-Encoding': ACCEPT}
+
+ttfbs = []
+for _ in range(20):
+    response, html, ttfb = request('GET', '/', headers=headers)
+    ttfbs.append(ttfb)
+ttfbs.sort()
+
+asset_bytes = 0
+raw = html
+if response.getheader('Content-Encoding') == 'gzip':
+    import gzip
+    raw = gzip.decompress(html)
+for url in re.findall(rb'(?:href|src)="([^"]+)"', raw):
+    url = url.decode()
+    if url.startswith(('http://', 'https://', '//')) and url.endswith(('.css', '.js')):
+        raise SystemExit('页面仍引用外部资源: ' + url)
+    if not url.endswith(('.css', '.js')):
+        continue
+    _, data, _ = request('GET', url, headers={'Accept-Encoding': ACCEPT})
+    asset_bytes += len(data)
+server.shutdown()
+print(json.dumps({
+    'ttfb_ms': ttfbs[len(ttfbs) // 2] * 1000,
+    'html_bytes': len(html),
+    'asset_bytes': asset_bytes,
+    'page_bytes': len(html) + asset_bytes,
+}))
+'''
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def _prepare_workdir(workdir):
+    """在临时目录中准备基准用的登录配置和空数据库"""
+    with open(os.path.join(workdir, 'secret.py'), 'w') as f:
+        f.write("USERNAME = 'bench'\nPASSWORD = 'bench'\n")
+
+
+def measure_importtime(workdir):
+    """使用 -X importtime 统计导入 app 的累计耗时（微秒）"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=workdir, env=_env(), capture_output=True, text=True, check=True)
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [part.strip() for part in line[len('import time:'):].split('|')]
+        if not parts[1].isdigit():
+            continue
+        modules[parts[2]] = int(parts[1])
+    return {
+        'app_us': modules.get('app', 0),
+        'openpyxl_us': modules.get('openpyxl', 0),
+    }
+
+
+def measure_first_request(workdir):
+    """冷启动一个进程，统计导入耗时、首个请求延迟和常驻内存"""
+    result = subprocess.run([sys.executable, '-c', FIRST_REQUEST_SCRIPT],
+                            cwd=workdir, env=_env(), capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_page_weight(workdir):
+    """启动HTTP服务，统计首页首字节时间和传输体积"""
+    result = subprocess.run([sys.executable, '-c', PAGE_WEIGHT_SCRIPT],
+                            cwd=workdir, env=_env(), capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(runs):
+    samples = []
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare_workdir(workdir)
+        for _ in range(runs):
+            sample = measure_first_request(workdir)
+            sample.update(measure_importtime(workdir))
+            sample.update(measure_page_weight(workdir))
+            samples.append(sample)
+    report = {key: statistics.median(sample[key] for sample in samples)
+              for key in ('import_ms', 'first_request_ms', 'rss_kb', 'app_us', 'openpyxl_us',
+                          'ttfb_ms', 'html_bytes', 'asset_bytes', 'page_bytes')}
+    report['openpyxl_loaded'] = any(sample['openpyxl_loaded'] for sample in samples)
+    report['runs'] = runs
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动性能基准')
+    parser.add_argument('--runs', type=int, default=5, help='重复次数，取中位数')
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
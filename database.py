@@ -1,18 +1,95 @@
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
 from datetime import datetime
 
 DATABASE = 'stock.db'
 
+DEFAULT_STORE = 'main'
+
+# 店铺ID -> (店铺名称, 数据库文件)，每个店铺使用独立的数据库
+STORES = {
+    DEFAULT_STORE: ('总店', DATABASE),
+}
+
+# 店铺ID -> (只读快照文件, 开始复制的时间戳)，由 backup 模块定期刷新
+SNAPSHOTS = {}
+
+# 当前请求所操作的店铺
+_current_store = ContextVar('current_store', default=DEFAULT_STORE)
+
+# 当前请求是否从只读快照读取
+_read_snapshot = ContextVar('read_snapshot', default=False)
+
+# 汇总报表时并行查询各店铺的线程池
+_executor = None
+
+
+def get_store():
+    """获取当前店铺ID"""
+    return _current_store.get()
+
+
+def set_store(store_id):
+    """切换当前店铺，返回用于恢复的token"""
+    if store_id not in STORES:
+        raise KeyError(f'未知店铺: {store_id}')
+    return _current_store.set(store_id)
+
+
+def reset_store(token):
+    """恢复切换前的店铺"""
+    _current_store.reset(token)
+
+
+@contextmanager
+def use_store(store_id):
+    """在with块内临时切换到指定店铺"""
+    token = set_store(store_id)
+    try:
+        yield
+    finally:
+        reset_store(token)
+
+
+def get_snapshot_time(store_id=None):
+    """获取店铺快照开始复制的时间戳，没有快照时返回 None"""
+    snapshot = SNAPSHOTS.get(store_id or get_store())
+    return snapshot[1] if snapshot else None
+
+
+@contextmanager
+def use_snapshot():
+    """在with块内从只读快照读取，尚无快照时仍读主库"""
+    token = _read_snapshot.set(True)
+    try:
+        yield
+    finally:
+        _read_snapshot.reset(token)
+
 
 def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DATABASE)
+    """获取当前店铺的数据库连接"""
+    store_id = get_store()
+    snapshot = SNAPSHOTS.get(store_id) if _read_snapshot.get() else None
+    if snapshot:
+        conn = sqlite3.connect(f'file:{snapshot[0]}?mode=ro', uri=True)
+    else:
+        conn = sqlite3.connect(STORES[store_id][1])
     conn.row_factory = sqlite3.Row
     return conn
 
 
 def init_db():
-    """初始化数据库表"""
+    """初始化所有店铺的数据库表"""
+    for store_id in STORES:
+        with use_store(store_id):
+            _init_store_db()
+
+
+def _init_store_db():
+    """初始化当前店铺的数据库表"""
     conn = get_db()
     cursor = conn.cursor()
 
@@ -57,10 +134,127 @@ def init_db():
         )
     ''')
 
+    # 每日销量汇总表（由 replenishment 模块按水位增量更新）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            product_code TEXT NOT NULL,
+            size TEXT NOT NULL,
+            day DATE NOT NULL,
+            category TEXT NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_code, size, day)
+        )
+    ''')
+
+    # 补货建议表
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS replenishment (
+            product_code TEXT NOT NULL,
+            size TEXT NOT NULL,
+            category TEXT NOT NULL,
+            velocity_7 REAL NOT NULL,
+            velocity_30 REAL NOT NULL,
+            velocity_90 REAL NOT NULL,
+            on_hand INTEGER NOT NULL,
+            days_of_cover REAL,
+            suggested_quantity INTEGER NOT NULL,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (product_code, size)
+        )
+    ''')
+
+    # 后台任务的水位等状态
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+
+    # 库存变动账本（只追加，与库存修改在同一事务中写入）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT NOT NULL,
+            product_code TEXT NOT NULL,
+            size TEXT NOT NULL,
+            purchase_price REAL NOT NULL,
+            delta INTEGER NOT NULL,
+            reason TEXT NOT NULL,
+            ref_id INTEGER,
+            created_at DATETIME NOT NULL
+        )
+    ''')
+
+    # 账本检查点及检查点时的库存数量
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            movement_id INTEGER NOT NULL,
+            created_at DATETIME NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_checkpoint_items (
+            checkpoint_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            product_code TEXT NOT NULL,
+            size TEXT NOT NULL,
+            purchase_price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            PRIMARY KEY (checkpoint_id, product_code, size, purchase_price)
+        )
+    ''')
+
+    # 首次启用账本时以现有库存作为初始检查点
+    cursor.execute('SELECT COUNT(*) AS count FROM ledger_checkpoints')
+    if cursor.fetchone()['count'] == 0:
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute('''
+            INSERT INTO ledger_checkpoints (movement_id, created_at)
+            SELECT COALESCE(MAX(id), 0), ? FROM stock_movements
+        ''', (now,))
+        cursor.execute('''
+            INSERT INTO ledger_checkpoint_items (checkpoint_id, category, product_code, size, purchase_price, quantity)
+            SELECT ?, category, product_code, size, purchase_price, quantity
+            FROM inventory WHERE quantity != 0
+        ''', (cursor.lastrowid,))
+
     conn.commit()
     conn.close()
 
 
+def _record_movement(cursor, category, product_code, size, purchase_price, delta, reason, ref_id=None):
+    """在账本中记录一次库存变动"""
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute('''
+        INSERT INTO stock_movements (category, product_code, size, purchase_price, delta, reason, ref_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (category, product_code, size, purchase_price, delta, reason, ref_id, now))
+
+
+def bump_inventory_version(cursor):
+    """库存变动计数加一，用于不经过账本直接修改库存的操作（如按账本重建）"""
+    cursor.execute('''
+        INSERT INTO job_state (name, value) VALUES ('inventory_version', 1)
+        ON CONFLICT(name) DO UPDATE SET value = value + 1
+    ''')
+
+
+def get_change_marks():
+    """获取 (库存变动计数, 最新账本变动ID)，用于判断内存索引是否过期"""
+    conn = get_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT
+            (SELECT value FROM job_state WHERE name = 'inventory_version') AS version,
+            (SELECT MAX(id) FROM stock_movements) AS movement_id
+    ''')
+    row = cursor.fetchone()
+    conn.close()
+    return row['version'] or 0, row['movement_id'] or 0
+
+
 def add_stock(category, product_code, size, purchase_price, quantity):
     """入库操作"""
     conn = get_db()
@@ -72,6 +266,7 @@ def add_stock(category, product_code, size, purchase_price, quantity):
         INSERT INTO stock_in (category, product_code, size, purchase_price, quantity, created_at)
         VALUES (?, ?, ?, ?, ?, ?)
     ''', (category, product_code, size, purchase_price, quantity, now))
+    stock_in_id = cursor.lastrowid
 
     # 更新库存（如果存在则增加数量，否则插入新记录）
     cursor.execute('''
@@ -81,6 +276,8 @@ def add_stock(category, product_code, size, purchase_price, quantity):
         DO UPDATE SET quantity = quantity + ?, category = ?
     ''', (category, product_code, size, purchase_price, quantity, quantity, category))
 
+    _record_movement(cursor, category, product_code, size, purchase_price, quantity, 'stock_in', stock_in_id)
+
     conn.commit()
     conn.close()
 
@@ -146,31 +343,37 @@ def remove_stock(item_id, sell_price, quantity):
     cursor = conn.cursor()
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-    # 获取库存信息
-    cursor.execute('SELECT * FROM inventory WHERE id = ?', (item_id,))
-    item = cursor.fetchone()
+    # 出错时关闭连接，未提交的事务随之回滚，避免写锁一直占着数据库
+    try:
+        # 获取库存信息
+        cursor.execute('SELECT * FROM inventory WHERE id = ?', (item_id,))
+        item = cursor.fetchone()
 
-    if not item or item['quantity'] < quantity:
-        conn.close()
-        return False, '库存不足'
+        if not item or item['quantity'] < quantity:
+            return False, '库存不足'
 
-    # 计算利润
-    profit = (sell_price - item['purchase_price']) * quantity
+        # 计算利润
+        profit = (sell_price - item['purchase_price']) * quantity
 
-    # 记录出库
-    cursor.execute('''
-        INSERT INTO stock_out (category, product_code, size, purchase_price, sell_price, quantity, profit, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (item['category'], item['product_code'], item['size'],
-          item['purchase_price'], sell_price, quantity, profit, now))
+        # 记录出库
+        cursor.execute('''
+            INSERT INTO stock_out (category, product_code, size, purchase_price, sell_price, quantity, profit, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (item['category'], item['product_code'], item['size'],
+              item['purchase_price'], sell_price, quantity, profit, now))
+        stock_out_id = cursor.lastrowid
 
-    # 更新库存
-    cursor.execute('''
-        UPDATE inventory SET quantity = quantity - ? WHERE id = ?
-    ''', (quantity, item_id))
+        # 更新库存
+        cursor.execute('''
+            UPDATE inventory SET quantity = quantity - ? WHERE id = ?
+        ''', (quantity, item_id))
 
-    conn.commit()
-    conn.close()
+        _record_movement(cursor, item['category'], item['product_code'], item['size'],
+                         item['purchase_price'], -quantity, 'stock_out', stock_out_id)
+
+        conn.commit()
+    finally:
+        conn.close()
     return True, '出库成功'
 
 
@@ -272,9 +475,21 @@ def delete_stock_out_record(record_id):
         ''', (record['category'], record['product_code'], record['size'],
               record['purchase_price'], record['quantity']))
 
+    # 已汇总进每日销量的记录需要同时扣除
+    cursor.execute("SELECT value FROM job_state WHERE name = 'sales_watermark'")
+    watermark = cursor.fetchone()
+    if watermark and record_id <= watermark['value']:
+        cursor.execute('''
+            UPDATE sales_daily SET quantity = quantity - ?
+            WHERE product_code = ? AND size = ? AND day = date(?)
+        ''', (record['quantity'], record['product_code'], record['size'], record['created_at']))
+
     # 删除出库记录
     cursor.execute('DELETE FROM stock_out WHERE id = ?', (record_id,))
 
+    _record_movement(cursor, record['category'], record['product_code'], record['size'],
+                     record['purchase_price'], record['quantity'], 'delete_stock_out', record_id)
+
     conn.commit()
     conn.close()
     return True, f'成功删除出库记录并恢复库存 {record["quantity"]} 件'
@@ -303,6 +518,85 @@ def delete_inventory(item_id, quantity):
         UPDATE inventory SET quantity = ? WHERE id = ?
     ''', (new_quantity, item_id))
 
+    _record_movement(cursor, item['category'], item['product_code'], item['size'],
+                     item['purchase_price'], -quantity, 'delete_inventory', item_id)
+
     conn.commit()
     conn.close()
     return True, f'成功删除 {quantity} 件商品'
+
+
+def _get_executor():
+    """获取汇总查询使用的线程池"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=max(len(STORES), 1),
+                                       thread_name_prefix='store-query')
+    return _executor
+
+
+def _run_in_store(store_id, func, *args):
+    """在指定店铺下执行查询函数"""
+    with use_store(store_id):
+        return func(*args)
+
+
+def _fan_out(func, *args):
+    """对所有店铺并行执行查询，返回 {店铺ID: 结果}，耗时取决于最慢的店铺"""
+    if len(STORES) == 1:
+        store_id = next(iter(STORES))
+        return {store_id: _run_in_store(store_id, func, *args)}
+    executor = _get_executor()
+    # 复制当前上下文，使工作线程沿用请求中的快照设置
+    futures = {store_id: executor.submit(copy_context().run, _run_in_store, store_id, func, *args)
+               for store_id in STORES}
+    return {store_id: future.result() for store_id, future in futures.items()}
+
+
+def get_consolidated_inventory(category=None):
+    """获取所有店铺的库存列表"""
+    results = _fan_out(get_inventory, category)
+    rows = []
+    for store_id, store_rows in results.items():
+        for row in store_rows:
+            item = dict(row)
+            item['store'] = store_id
+            item['store_name'] = STORES[store_id][0]
+            rows.append(item)
+    rows.sort(key=lambda item: (item['product_code'], item['size'], item['store']))
+    return rows
+
+
+def get_consolidated_total_value():
+    """计算所有店铺的总货值，返回 (总货值, {店铺ID: 货值})"""
+    per_store = _fan_out(get_total_value)
+    return sum(per_store.values()), per_store
+
+
+def _merge_summary(results, key):
+    """按月份/年份合并各店铺的销售汇总"""
+    merged = {}
+    for store_rows in results.values():
+        for row in store_rows:
+            total = merged.setdefault(row[key], {
+                key: row[key],
+                'revenue': 0,
+                'cost': 0,
+                'total_profit': 0,
+                'total_quantity': 0,
+            })
+            total['revenue'] += row['revenue'] or 0
+            total['cost'] += row['cost'] or 0
+            total['total_profit'] += row['total_profit'] or 0
+            total['total_quantity'] += row['total_quantity'] or 0
+    return sorted(merged.values(), key=lambda row: row[key], reverse=True)
+
+
+def get_consolidated_monthly_summary():
+    """获取所有店铺的月度汇总"""
+    return _merge_summary(_fan_out(get_monthly_summary), 'month')
+
+
+def get_consolidated_yearly_summary():
+    """获取所有店铺的年度汇总"""
+    return _merge_summary(_fan_out(get_yearly_summary), 'year')
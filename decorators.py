@@ -0,0 +1,37 @@
+from flask import redirect, url_for, request, session, g
+from functools import wraps
+from datetime import datetime
+import time
+import database
+
+
+def login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'logged_in' not in session:
+            return redirect(url_for('login'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def snapshot_read(f):
+    """报表类请求从只读快照读取，避免与出库写入争用主库
+
+    当前会话在快照生成之后有过写入时改读主库，保证用户能看到自己刚做的修改。
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        snapshot_time = database.get_snapshot_time()
+        if snapshot_time is None or session.get('last_write', 0) >= snapshot_time:
+            return f(*args, **kwargs)
+        g.snapshot_at = datetime.fromtimestamp(snapshot_time).strftime('%Y-%m-%d %H:%M:%S')
+        with database.use_snapshot():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+def record_write(response):
+    """记录当前会话最近一次写操作的时间，供 snapshot_read 判断快照是否过期"""
+    if request.method == 'POST' and request.endpoint != 'login' and 'logged_in' in session:
+        session['last_write'] = time.time()
+    return response
@@ -0,0 +1,411 @@
+from flask import Blueprint, request, Response
+from io import BytesIO
+from datetime import datetime
+from urllib.parse import quote
+import database
+import replenishment
+from decorators import login_required, snapshot_read
+
+# openpyxl 体积较大，只在实际导出时才导入，避免拖慢启动和占用每个进程的内存
+exports = Blueprint('exports', __name__, url_prefix='/export')
+
+
+def create_excel_style():
+    """创建Excel样式"""
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+    header_font = Font(bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    return header_font, header_fill, header_alignment, thin_border
+
+
+@exports.route('/inventory')
+@login_required
+@snapshot_read
+def export_inventory():
+    """导出当前库存为Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    category = request.args.get('category', 'all')
+    inventory = database.get_inventory(category)
+    total_value = database.get_total_value()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "当前库存"
+
+    header_font, header_fill, header_alignment, thin_border = create_excel_style()
+
+    # 标题行
+    headers = ['类别', '货号', '尺码', '进货价', '数量', '货值']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    # 数据行
+    for row_idx, item in enumerate(inventory, 2):
+        ws.cell(row=row_idx, column=1, value=item['category']).border = thin_border
+        ws.cell(row=row_idx, column=2, value=item['product_code']).border = thin_border
+        ws.cell(row=row_idx, column=3, value=item['size']).border = thin_border
+        ws.cell(row=row_idx, column=4, value=item['purchase_price']).border = thin_border
+        ws.cell(row=row_idx, column=5, value=item['quantity']).border = thin_border
+        ws.cell(row=row_idx, column=6, value=item['purchase_price'] * item['quantity']).border = thin_border
+
+    # 合计行
+    last_row = len(inventory) + 2
+    ws.cell(row=last_row, column=5, value='总货值:').font = Font(bold=True)
+    ws.cell(row=last_row, column=6, value=total_value).font = Font(bold=True)
+
+    # 调整列宽
+    ws.column_dimensions['A'].width = 10
+    ws.column_dimensions['B'].width = 15
+    ws.column_dimensions['C'].width = 10
+    ws.column_dimensions['D'].width = 12
+    ws.column_dimensions['E'].width = 10
+    ws.column_dimensions['F'].width = 12
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    filename = f"库存_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    encoded_filename = quote(filename)
+    return Response(
+        output.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
+
+
+@exports.route('/stock_in')
+@login_required
+@snapshot_read
+def export_stock_in():
+    """导出入库记录为Excel"""
+    from openpyxl import Workbook
+
+    records = database.get_stock_in_records()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "入库记录"
+
+    header_font, header_fill, header_alignment, thin_border = create_excel_style()
+
+    headers = ['时间', '类别', '货号', '尺码', '进货价', '数量', '金额']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    for row_idx, record in enumerate(records, 2):
+        ws.cell(row=row_idx, column=1, value=record['created_at']).border = thin_border
+        ws.cell(row=row_idx, column=2, value=record['category']).border = thin_border
+        ws.cell(row=row_idx, column=3, value=record['product_code']).border = thin_border
+        ws.cell(row=row_idx, column=4, value=record['size']).border = thin_border
+        ws.cell(row=row_idx, column=5, value=record['purchase_price']).border = thin_border
+        ws.cell(row=row_idx, column=6, value=record['quantity']).border = thin_border
+        ws.cell(row=row_idx, column=7, value=record['purchase_price'] * record['quantity']).border = thin_border
+
+    ws.column_dimensions['A'].width = 20
+    ws.column_dimensions['B'].width = 10
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 10
+    ws.column_dimensions['E'].width = 12
+    ws.column_dimensions['F'].width = 10
+    ws.column_dimensions['G'].width = 12
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    filename = f"入库记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    encoded_filename = quote(filename)
+    return Response(
+        output.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
+
+
+@exports.route('/stock_out')
+@login_required
+@snapshot_read
+def export_stock_out():
+    """导出出库记录为Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    records = database.get_stock_out_records()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "出库记录"
+
+    header_font, header_fill, header_alignment, thin_border = create_excel_style()
+
+    headers = ['时间', '类别', '货号', '尺码', '进货价', '卖出价', '数量', '利润']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    for row_idx, record in enumerate(records, 2):
+        ws.cell(row=row_idx, column=1, value=record['created_at']).border = thin_border
+        ws.cell(row=row_idx, column=2, value=record['category']).border = thin_border
+        ws.cell(row=row_idx, column=3, value=record['product_code']).border = thin_border
+        ws.cell(row=row_idx, column=4, value=record['size']).border = thin_border
+        ws.cell(row=row_idx, column=5, value=record['purchase_price']).border = thin_border
+        ws.cell(row=row_idx, column=6, value=record['sell_price']).border = thin_border
+        ws.cell(row=row_idx, column=7, value=record['quantity']).border = thin_border
+        profit_cell = ws.cell(row=row_idx, column=8, value=record['profit'])
+        profit_cell.border = thin_border
+        if record['profit'] < 0:
+            profit_cell.font = Font(color='FF0000')
+
+    ws.column_dimensions['A'].width = 20
+    ws.column_dimensions['B'].width = 10
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 10
+    ws.column_dimensions['E'].width = 12
+    ws.column_dimensions['F'].width = 12
+    ws.column_dimensions['G'].width = 10
+    ws.column_dimensions['H'].width = 12
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    filename = f"出库记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    encoded_filename = quote(filename)
+    return Response(
+        output.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
+
+
+@exports.route('/monthly')
+@login_required
+@snapshot_read
+def export_monthly():
+    """导出月度汇总为Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    summary = database.get_monthly_summary()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "月度汇总"
+
+    header_font, header_fill, header_alignment, thin_border = create_excel_style()
+
+    headers = ['月份', '销售额', '成本', '利润', '销量', '利润率']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    total_revenue = 0
+    total_cost = 0
+    total_profit = 0
+    total_quantity = 0
+
+    for row_idx, record in enumerate(summary, 2):
+        ws.cell(row=row_idx, column=1, value=record['month']).border = thin_border
+        ws.cell(row=row_idx, column=2, value=record['revenue']).border = thin_border
+        ws.cell(row=row_idx, column=3, value=record['cost']).border = thin_border
+        profit_cell = ws.cell(row=row_idx, column=4, value=record['total_profit'])
+        profit_cell.border = thin_border
+        if record['total_profit'] < 0:
+            profit_cell.font = Font(color='FF0000')
+        ws.cell(row=row_idx, column=5, value=record['total_quantity']).border = thin_border
+        profit_rate = (record['total_profit'] / record['cost'] * 100) if record['cost'] else 0
+        ws.cell(row=row_idx, column=6, value=f"{profit_rate:.1f}%").border = thin_border
+
+        total_revenue += record['revenue'] or 0
+        total_cost += record['cost'] or 0
+        total_profit += record['total_profit'] or 0
+        total_quantity += record['total_quantity'] or 0
+
+    # 合计行
+    last_row = len(summary) + 2
+    ws.cell(row=last_row, column=1, value='合计').font = Font(bold=True)
+    ws.cell(row=last_row, column=2, value=total_revenue).font = Font(bold=True)
+    ws.cell(row=last_row, column=3, value=total_cost).font = Font(bold=True)
+    ws.cell(row=last_row, column=4, value=total_profit).font = Font(bold=True)
+    ws.cell(row=last_row, column=5, value=total_quantity).font = Font(bold=True)
+
+    ws.column_dimensions['A'].width = 12
+    ws.column_dimensions['B'].width = 15
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 15
+    ws.column_dimensions['E'].width = 10
+    ws.column_dimensions['F'].width = 12
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    filename = f"月度汇总_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    encoded_filename = quote(filename)
+    return Response(
+        output.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
+
+
+@exports.route('/yearly')
+@login_required
+@snapshot_read
+def export_yearly():
+    """导出年度汇总为Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    summary = database.get_yearly_summary()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "年度汇总"
+
+    header_font, header_fill, header_alignment, thin_border = create_excel_style()
+
+    headers = ['年份', '销售额', '成本', '利润', '销量', '利润率']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    total_revenue = 0
+    total_cost = 0
+    total_profit = 0
+    total_quantity = 0
+
+    for row_idx, record in enumerate(summary, 2):
+        ws.cell(row=row_idx, column=1, value=record['year']).border = thin_border
+        ws.cell(row=row_idx, column=2, value=record['revenue']).border = thin_border
+        ws.cell(row=row_idx, column=3, value=record['cost']).border = thin_border
+        profit_cell = ws.cell(row=row_idx, column=4, value=record['total_profit'])
+        profit_cell.border = thin_border
+        if record['total_profit'] < 0:
+            profit_cell.font = Font(color='FF0000')
+        ws.cell(row=row_idx, column=5, value=record['total_quantity']).border = thin_border
+        profit_rate = (record['total_profit'] / record['cost'] * 100) if record['cost'] else 0
+        ws.cell(row=row_idx, column=6, value=f"{profit_rate:.1f}%").border = thin_border
+
+        total_revenue += record['revenue'] or 0
+        total_cost += record['cost'] or 0
+        total_profit += record['total_profit'] or 0
+        total_quantity += record['total_quantity'] or 0
+
+    # 合计行
+    last_row = len(summary) + 2
+    ws.cell(row=last_row, column=1, value='合计').font = Font(bold=True)
+    ws.cell(row=last_row, column=2, value=total_revenue).font = Font(bold=True)
+    ws.cell(row=last_row, column=3, value=total_cost).font = Font(bold=True)
+    ws.cell(row=last_row, column=4, value=total_profit).font = Font(bold=True)
+    ws.cell(row=last_row, column=5, value=total_quantity).font = Font(bold=True)
+
+    ws.column_dimensions['A'].width = 10
+    ws.column_dimensions['B'].width = 15
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 15
+    ws.column_dimensions['E'].width = 10
+    ws.column_dimensions['F'].width = 12
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    filename = f"年度汇总_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    encoded_filename = quote(filename)
+    return Response(
+        output.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
+
+
+@exports.route('/replenishment')
+@login_required
+@snapshot_read
+def export_replenishment():
+    """导出补货建议为Excel"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    suggestions = replenishment.get_suggestions()
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "补货建议"
+
+    header_font, header_fill, header_alignment, thin_border = create_excel_style()
+
+    headers = ['类别', '货号', '尺码', '7天日均', '30天日均', '90天日均', '库存', '可售天数', '建议补货']
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=1, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+
+    for row_idx, item in enumerate(suggestions, 2):
+        ws.cell(row=row_idx, column=1, value=item['category']).border = thin_border
+        ws.cell(row=row_idx, column=2, value=item['product_code']).border = thin_border
+        ws.cell(row=row_idx, column=3, value=item['size']).border = thin_border
+        ws.cell(row=row_idx, column=4, value=round(item['velocity_7'], 2)).border = thin_border
+        ws.cell(row=row_idx, column=5, value=round(item['velocity_30'], 2)).border = thin_border
+        ws.cell(row=row_idx, column=6, value=round(item['velocity_90'], 2)).border = thin_border
+        ws.cell(row=row_idx, column=7, value=item['on_hand']).border = thin_border
+        days_of_cover = item['days_of_cover']
+        ws.cell(row=row_idx, column=8,
+                value=round(days_of_cover, 1) if days_of_cover is not None else '-').border = thin_border
+        suggested_cell = ws.cell(row=row_idx, column=9, value=item['suggested_quantity'])
+        suggested_cell.border = thin_border
+        if item['suggested_quantity'] > 0:
+            suggested_cell.font = Font(bold=True, color='FF0000')
+
+    ws.column_dimensions['A'].width = 10
+    ws.column_dimensions['B'].width = 15
+    ws.column_dimensions['C'].width = 10
+    ws.column_dimensions['D'].width = 10
+    ws.column_dimensions['E'].width = 10
+    ws.column_dimensions['F'].width = 10
+    ws.column_dimensions['G'].width = 10
+    ws.column_dimensions['H'].width = 10
+    ws.column_dimensions['I'].width = 10
+
+    output = BytesIO()
+    wb.save(output)
+    output.seek(0)
+
+    filename = f"补货建议_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    encoded_filename = quote(filename)
+    return Response(
+        output.getvalue(),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f"attachment; filename*=UTF-8''{encoded_filename}"}
+    )
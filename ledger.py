@@ -0,0 +1,188 @@
+import sys
+from datetime import datetime
+
+import database
+
+# 自动生成检查点的间隔（秒）
+CHECKPOINT_INTERVAL = 24 * 60 * 60
+
+
+def _replay(cursor):
+    """从最近的检查点开始重放账本，返回 ({库存键: [类别, 数量]}, 最后一条变动ID)"""
+    cursor.execute('SELECT id, movement_id FROM ledger_checkpoints ORDER BY id DESC LIMIT 1')
+    checkpoint = cursor.fetchone()
+
+    state = {}
+    if checkpoint:
+        cursor.execute('''
+            SELECT category, product_code, size, purchase_price, quantity
+            FROM ledger_checkpoint_items WHERE checkpoint_id = ?
+        ''', (checkpoint['id'],))
+        for row in cursor.fetchall():
+            state[(row['product_code'], row['size'], row['purchase_price'])] = [row['category'], row['quantity']]
+    last_movement_id = checkpoint['movement_id'] if checkpoint else 0
+
+    cursor.execute('''
+        SELECT id, category, product_code, size, purchase_price, delta
+        FROM stock_movements WHERE id > ?
+        ORDER BY id
+    ''', (last_movement_id,))
+    for row in cursor.fetchall():
+        entry = state.setdefault((row['product_code'], row['size'], row['purchase_price']), [row['category'], 0])
+        entry[0] = row['category']
+        entry[1] += row['delta']
+        last_movement_id = row['id']
+    return state, last_movement_id
+
+
+def _diff(cursor, state):
+    """比较账本重放结果和当前库存，返回差异列表"""
+    cursor.execute('SELECT id, category, product_code, size, purchase_price, quantity FROM inventory')
+    inventory = {(row['product_code'], row['size'], row['purchase_price']): row for row in cursor.fetchall()}
+
+    discrepancies = []
+    for key in sorted(set(state) | set(inventory)):
+        expected = state[key][1] if key in state else 0
+        actual = inventory[key]['quantity'] if key in inventory else 0
+        if expected != actual:
+            product_code, size, purchase_price = key
+            discrepancies.append({
+                'inventory_id': inventory[key]['id'] if key in inventory else None,
+                'category': state[key][0] if key in state else inventory[key]['category'],
+                'product_code': product_code,
+                'size': size,
+                'purchase_price': purchase_price,
+                'expected': expected,
+                'actual': actual,
+            })
+    return discrepancies
+
+
+def verify():
+    """校验当前店铺的库存是否与账本一致，返回差异列表"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    # 在同一个读事务中完成重放和比较，保证看到的是同一时刻的数据
+    cursor.execute('BEGIN')
+    try:
+        state, _ = _replay(cursor)
+        return _diff(cursor, state)
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def rebuild():
+    """按账本修正当前店铺的库存数量，返回修正前的差异列表"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        state, _ = _replay(cursor)
+        discrepancies = _diff(cursor, state)
+        for item in discrepancies:
+            if item['inventory_id'] is not None:
+                cursor.execute('UPDATE inventory SET quantity = ? WHERE id = ?',
+                               (item['expected'], item['inventory_id']))
+            else:
+                cursor.execute('''
+                    INSERT INTO inventory (category, product_code, size, purchase_price, quantity)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (item['category'], item['product_code'], item['size'],
+                      item['purchase_price'], item['expected']))
+        if discrepancies:
+            database.bump_inventory_version(cursor)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return discrepancies
+
+
+def checkpoint():
+    """把账本重放结果保存为新的检查点，之后的校验只需重放检查点之后的变动"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        state, last_movement_id = _replay(cursor)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute('INSERT INTO ledger_checkpoints (movement_id, created_at) VALUES (?, ?)',
+                       (last_movement_id, now))
+        checkpoint_id = cursor.lastrowid
+        cursor.executemany('''
+            INSERT INTO ledger_checkpoint_items (checkpoint_id, category, product_code, size, purchase_price, quantity)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(checkpoint_id, category, *key, quantity)
+              for key, (category, quantity) in state.items() if quantity != 0])
+        # 只保留最近的检查点
+        cursor.execute('DELETE FROM ledger_checkpoint_items WHERE checkpoint_id < ?', (checkpoint_id,))
+        cursor.execute('DELETE FROM ledger_checkpoints WHERE id < ?', (checkpoint_id,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return checkpoint_id
+
+
+def seconds_until_checkpoint():
+    """距离当前店铺下次生成检查点的秒数，按最近一个检查点的时间计算"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT created_at FROM ledger_checkpoints ORDER BY id DESC LIMIT 1')
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        return 0
+    last = datetime.strptime(row['created_at'], '%Y-%m-%d %H:%M:%S')
+    return CHECKPOINT_INTERVAL - (datetime.now() - last).total_seconds()
+
+
+def run_due_checkpoints():
+    """为检查点已过期的店铺生成检查点，返回距离下一次到期的秒数"""
+    wait = CHECKPOINT_INTERVAL
+    for store_id in database.STORES:
+        with database.use_store(store_id):
+            remaining = seconds_until_checkpoint()
+            if remaining <= 0:
+                checkpoint()
+                remaining = CHECKPOINT_INTERVAL
+            wait = min(wait, remaining)
+    return wait
+
+
+def main(argv):
+    """命令行: python ledger.py [verify|rebuild|checkpoint]"""
+    command = argv[1] if len(argv) > 1 else 'verify'
+    if command not in ('verify', 'rebuild', 'checkpoint'):
+        print(main.__doc__)
+        return 2
+
+    database.init_db()
+    failed = False
+    for store_id in database.STORES:
+        with database.use_store(store_id):
+            if command == 'checkpoint':
+                print(f'{store_id}: 已生成检查点 {checkpoint()}')
+                continue
+            discrepancies = verify() if command == 'verify' else rebuild()
+            for item in discrepancies:
+                print(f"{store_id}: {item['product_code']} 尺码 {item['size']} "
+                      f"进货价 {item['purchase_price']}: 账本 {item['expected']}，库存 {item['actual']}")
+            if command == 'rebuild':
+                print(f'{store_id}: 已修正 {len(discrepancies)} 项')
+            elif discrepancies:
+                failed = True
+            else:
+                # 校验通过后生成检查点，下次校验只需重放此后的变动
+                checkpoint()
+                print(f'{store_id}: 库存与账本一致')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,181 @@
+import math
+from datetime import date, datetime, timedelta
+
+import database
+
+# 滚动窗口（天）
+WINDOWS = (7, 30, 90)
+
+# 计算可售天数和补货目标所用的窗口
+VELOCITY_WINDOW = 30
+
+# 补货到货周期和到货后希望覆盖的天数
+LEAD_TIME_DAYS = 7
+COVER_DAYS = 21
+
+# 每批读取的出库记录条数
+BATCH_SIZE = 1000
+
+# 后台任务更新补货建议的间隔（秒）
+UPDATE_INTERVAL = 15 * 60
+
+WATERMARK = 'sales_watermark'
+
+
+def _ingest(cursor):
+    """把水位之后的新出库记录汇总进每日销量表，返回处理的条数"""
+    cursor.execute('SELECT value FROM job_state WHERE name = ?', (WATERMARK,))
+    row = cursor.fetchone()
+    watermark = row['value'] if row else 0
+
+    processed = 0
+    while True:
+        cursor.execute('''
+            SELECT id, category, product_code, size, quantity, date(created_at) AS day
+            FROM stock_out WHERE id > ?
+            ORDER BY id LIMIT ?
+        ''', (watermark, BATCH_SIZE))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+
+        cursor.executemany('''
+            INSERT INTO sales_daily (product_code, size, day, category, quantity)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(product_code, size, day)
+            DO UPDATE SET quantity = quantity + excluded.quantity, category = excluded.category
+        ''', [(r['product_code'], r['size'], r['day'], r['category'], r['quantity']) for r in rows])
+
+        watermark = rows[-1]['id']
+        processed += len(rows)
+
+    cursor.execute('''
+        INSERT INTO job_state (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+    ''', (WATERMARK, watermark))
+    return processed
+
+
+def _recompute(cursor, today):
+    """根据每日销量和当前库存重新计算补货建议"""
+    start = today - timedelta(days=max(WINDOWS) - 1)
+    cursor.execute('''
+        SELECT product_code, size, category, day, quantity
+        FROM sales_daily WHERE day >= ?
+    ''', (start.isoformat(),))
+
+    # (货号, 尺码) -> 各窗口内的销量
+    sold = {}
+    categories = {}
+    for row in cursor.fetchall():
+        key = (row['product_code'], row['size'])
+        age = max((today - date.fromisoformat(row['day'])).days, 0)
+        totals = sold.setdefault(key, [0] * len(WINDOWS))
+        for i, window in enumerate(WINDOWS):
+            if age < window:
+                totals[i] += row['quantity']
+        categories[key] = row['category']
+
+    cursor.execute('''
+        SELECT product_code, size, MAX(category) AS category, SUM(quantity) AS quantity
+        FROM inventory WHERE quantity > 0
+        GROUP BY product_code, size
+    ''')
+    on_hand = {}
+    for row in cursor.fetchall():
+        key = (row['product_code'], row['size'])
+        on_hand[key] = row['quantity']
+        categories.setdefault(key, row['category'])
+
+    # 按货号汇总，用于计算尺码分布
+    velocity_index = WINDOWS.index(VELOCITY_WINDOW)
+    product_sold = {}
+    for (product_code, _), totals in sold.items():
+        product_totals = product_sold.setdefault(product_code, [0] * len(WINDOWS))
+        for i, quantity in enumerate(totals):
+            product_totals[i] += quantity
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    rows = []
+    for key in set(sold) | set(on_hand):
+        product_code, size = key
+        totals = sold.get(key, [0] * len(WINDOWS))
+        product_totals = product_sold.get(product_code, [0] * len(WINDOWS))
+        quantity = on_hand.get(key, 0)
+        velocities = [total / window for total, window in zip(totals, WINDOWS)]
+
+        velocity = velocities[velocity_index]
+        days_of_cover = quantity / velocity if velocity else None
+
+        # 货号整体的销售速度按最长窗口的尺码分布分配，避免单个尺码销量稀疏造成波动
+        product_velocity = product_totals[velocity_index] / VELOCITY_WINDOW
+        share = totals[-1] / product_totals[-1] if product_totals[-1] else 0
+        target = product_velocity * share * (LEAD_TIME_DAYS + COVER_DAYS)
+        suggested = max(math.ceil(target - quantity - 1e-9), 0)
+
+        rows.append((product_code, size, categories[key], *velocities,
+                     quantity, days_of_cover, suggested, now))
+
+    cursor.execute('DELETE FROM replenishment')
+    cursor.executemany('''
+        INSERT INTO replenishment (product_code, size, category, velocity_7, velocity_30, velocity_90,
+                                   on_hand, days_of_cover, suggested_quantity, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def update(today=None):
+    """增量更新当前店铺的补货建议，返回新处理的出库记录条数"""
+    today = today or date.today()
+    conn = database.get_db()
+    cursor = conn.cursor()
+    # 先取得写锁，防止并发更新重复汇总同一批记录
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        processed = _ingest(cursor)
+        _recompute(cursor, today)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return processed
+
+
+def update_all(today=None):
+    """增量更新所有店铺的补货建议，返回 {店铺ID: 新处理的出库记录条数}"""
+    processed = {}
+    for store_id in database.STORES:
+        with database.use_store(store_id):
+            processed[store_id] = update(today)
+    return processed
+
+
+def get_updated_at():
+    """获取当前店铺补货建议的计算时间，尚未计算时返回 None"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('SELECT MAX(updated_at) AS updated_at FROM replenishment')
+    row = cursor.fetchone()
+    conn.close()
+    return row['updated_at']
+
+
+def get_suggestions():
+    """获取补货建议列表，需要补货的排在前面"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM replenishment
+        ORDER BY suggested_quantity DESC, days_of_cover IS NULL, days_of_cover, product_code, size
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+
+if __name__ == '__main__':
+    database.init_db()
+    for store_id, processed in update_all().items():
+        print(f'{store_id}: 处理 {processed} 条出库记录')
@@ -0,0 +1,102 @@
+import threading
+
+import database
+
+# 条码中货号与尺码之间可能出现的分隔符
+SEPARATORS = '-_/ '
+
+# 店铺ID -> [库存变动计数, 已处理的账本变动ID, {(货号, 尺码): [库存项]}]
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _build_index():
+    """从数据库读取有货的库存，按 (货号, 尺码) 建立索引"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT * FROM inventory WHERE quantity > 0
+        ORDER BY id
+    ''')
+    index = {}
+    for row in cursor.fetchall():
+        index.setdefault((row['product_code'], row['size']), []).append(dict(row))
+    conn.close()
+    return index
+
+
+def _refresh_keys(index, after_id, until_id):
+    """只重新读取账本中 (after_id, until_id] 涉及的 (货号, 尺码)"""
+    conn = database.get_db()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT product_code, size FROM stock_movements
+        WHERE id > ? AND id <= ?
+    ''', (after_id, until_id))
+    # 先在索引之外查好所有变动的条目，再逐项替换，读取方不会看到修改到一半的条目
+    updates = {}
+    for key in [(row['product_code'], row['size']) for row in cursor.fetchall()]:
+        cursor.execute('''
+            SELECT * FROM inventory
+            WHERE product_code = ? AND size = ? AND quantity > 0
+            ORDER BY id
+        ''', key)
+        updates[key] = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+
+    for key, rows in updates.items():
+        if rows:
+            index[key] = rows
+        else:
+            index.pop(key, None)
+
+
+def _get_index():
+    """获取当前店铺的索引，读取方不加锁，只能用 get 访问条目
+
+    账本有新变动时只更新涉及的货号尺码；冷启动或库存被绕过账本修改（计数变化）时整体重建。
+    """
+    store_id = database.get_store()
+    version, movement_id = database.get_change_marks()
+    cached = _indexes.get(store_id)
+    if cached and cached[0] == version and cached[1] == movement_id:
+        return cached[2]
+    with _lock:
+        cached = _indexes.get(store_id)
+        # 变动ID回退（如从备份恢复）时也整体重建
+        if cached and cached[0] == version and cached[1] <= movement_id:
+            if cached[1] < movement_id:
+                # 先取变动ID再读库存，期间的新写入会在下次扫描时再次更新
+                _refresh_keys(cached[2], cached[1], movement_id)
+                cached[1] = movement_id
+            return cached[2]
+        index = _build_index()
+        _indexes[store_id] = [version, movement_id, index]
+        return index
+
+
+def warm():
+    """启动时为所有店铺预先建立索引"""
+    for store_id in database.STORES:
+        with database.use_store(store_id):
+            _get_index()
+
+
+def parse_barcode(barcode, index):
+    """把条码拆分为 (货号, 尺码)，优先匹配最长的货号，找不到时返回 None"""
+    barcode = barcode.strip()
+    for i in range(len(barcode) - 1, 0, -1):
+        key = (barcode[:i].rstrip(SEPARATORS), barcode[i:])
+        if key in index:
+            return key
+    return None
+
+
+def lookup(barcode):
+    """根据条码精确查找有货的库存项"""
+    index = _get_index()
+    key = parse_barcode(barcode, index)
+    if key is None:
+        return []
+    # 索引可能正被其他线程更新，售罄的条目随时会被移除
+    return index.get(key, [])